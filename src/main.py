@@ -6,9 +6,15 @@ from rosibot.bot import RosiBot
 from rosibot.settings import Settings
 
 logger = logging.getLogger(__name__)
-settings = Settings()
-bot = RosiBot(settings)
 
-if __name__ == "__main__":
+
+def main() -> None:
+    """Parses settings, creates the bot and starts it"""
+    settings = Settings()
+    bot = RosiBot(settings)
     logger.info("Starting Bot!")
     bot.start()
+
+
+if __name__ == "__main__":
+    main()
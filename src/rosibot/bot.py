@@ -1,22 +1,22 @@
 """Main Bot implementation
 """
 
-from typing import Awaitable, Callable, Any
+from typing import Awaitable, Callable, Any, Optional
 
 import datetime
 import asyncio
+import functools
 import logging
 from enum import IntEnum
+from types import MethodType
 
-import redis
+import redis.asyncio as aioredis
+from redis.commands.core import AsyncScript
 from signalbot import SignalBot, Command, Context
 
 from rosibot.messages import Messages
 from rosibot.settings import Settings
 
-messages = Messages()
-_settings = Settings()
-
 BOT_COMMAND_DELIMITER = "!"
 
 MONDAY = 0
@@ -24,19 +24,82 @@ FRIDAY = 5
 LOCK_FILE_PATH = "/tmp"
 ROSIBOT_PREFIX = "[ROSIBOT]: "
 MAX_COMMAND_LENGTH = 128
+PERIODIC_MAX_SLEEP = 3600
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
-cache = redis.Redis(host="localhost", port=6379, db=0)
+_cached_week: Optional[tuple[int, int, str]] = None  # pylint: disable=invalid-name
+
+# Sets KEYS[1] to ARGV[1] unless it already holds that value. Returns the previous value (nil if unset)
+SET_STATE_SCRIPT = """
+local old = redis.call('GET', KEYS[1])
+if old ~= ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+return old
+"""
+
+# Sets KEYS[1] to ARGV[1] if it is unset or holds ARGV[2]. Returns the previous value (nil if unset)
+ADVANCE_STATE_SCRIPT = """
+local old = redis.call('GET', KEYS[1])
+if not old or old == ARGV[2] then
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+return old
+"""
+
+
+@functools.cache
+def _cache() -> aioredis.Redis:
+    """Returns the shared Redis client. Created on first use to keep imports free of side effects"""
+    return aioredis.Redis(host="localhost", port=6379, db=0)
+
+
+@functools.cache
+def _messages() -> Messages:
+    """Returns the shared message definitions. Loaded on first use to keep imports free of side effects"""
+    return Messages()
+
+
+@functools.cache
+def _set_state() -> AsyncScript:
+    """Returns SET_STATE_SCRIPT registered on the shared Redis client"""
+    return _cache().register_script(SET_STATE_SCRIPT)
 
 
-def today() -> tuple[int, int, int]:
+@functools.cache
+def _advance_state() -> AsyncScript:
+    """Returns ADVANCE_STATE_SCRIPT registered on the shared Redis client"""
+    return _cache().register_script(ADVANCE_STATE_SCRIPT)
+
+
+def today() -> tuple[int, int, str]:
     """Returns some ad-hoc date information used to handle cache based locking
 
+    Year, week and cache key only change once per calendar week and are memoized.
+
     Returns:
-        Tuple[int, int]: Tuple of yer, weekday (0-6), week number (0-42)
+        Tuple[int, int, str]: Tuple of weekday (0-6), week number (1-53) and weekly cache key
+    """
+    global _cached_week  # pylint: disable=global-statement
+    year, week, iso_weekday = datetime.date.today().isocalendar()
+    if _cached_week is None or _cached_week[:2] != (year, week):
+        _cached_week = (year, week, get_cache_key(year, week))
+    return (iso_weekday - 1, week, _cached_week[2])
+
+
+def seconds_until_next_trigger() -> float:
+    """Returns the number of seconds until the next periodic message boundary.
+
+    Boundaries are midnight of the next MONDAY or FRIDAY, whichever comes first.
+    If today is one of those days the boundary is a week ahead.
     """
-    _today = datetime.datetime.today()
-    return (_today.year, _today.weekday(), _today.isocalendar().week)
+    now = datetime.datetime.now()
+    midnight = datetime.datetime.combine(now.date(), datetime.time())
+    deltas = []
+    for target in (MONDAY, FRIDAY):
+        days = (target - now.weekday()) % 7 or 7
+        deltas.append((midnight + datetime.timedelta(days=days) - now).total_seconds())
+    return min(deltas)
 
 
 def get_cache_key(year: int, week: int) -> str:
@@ -44,17 +107,6 @@ def get_cache_key(year: int, week: int) -> str:
     return f"{year}{week}"
 
 
-if _settings.debug:
-    logger.warning(
-        "DEBUG MODE ENABLED. "
-        "WILL CLEAR WEEKLY CACHE. "
-        "THIS RESULTS IN ALL PERIODIC MESSAGES BEING RESENT. "
-        "BE CAREFUL TO AVOID SPAM"
-    )
-    year_, _, week_ = today()
-    cache_key_ = get_cache_key(year_, week_)
-    cache.delete(cache_key_)
-
 command_registry: dict[str, Callable[[Any, Any], Awaitable[Any]]] = {}
 
 
@@ -67,6 +119,11 @@ class PeriodicState(IntEnum):
     DONE = 2
 
 
+_FRESH = int(PeriodicState.FRESH)
+_REMINDER_SENT = int(PeriodicState.REMINDER_SENT)
+_DONE = int(PeriodicState.DONE)
+
+
 def register_command(command: str) -> Callable[..., None]:
     """Adds a command and the proper handler function to a global registry"""
     if command in command_registry:
@@ -85,6 +142,10 @@ class RosiBot(Command):
 
     def __init__(self, settings: Settings) -> None:
         self.signal_group_id = settings.signal_group_id
+        self.debug = settings.debug
+        self._state_changed = asyncio.Event()
+        self._monday_message = _messages().get_periodic_message("WEEKLY_MONDAY")
+        self._friday_message = _messages().get_periodic_message("WEEKLY_FRIDAY")
         self.signal_bot = SignalBot(
             {
                 "signal_service": settings.signal_service,
@@ -92,10 +153,26 @@ class RosiBot(Command):
             }
         )
         self.register()
+        self._dispatch: dict[str, Callable[[str], Awaitable[Any]]] = {
+            command: MethodType(func, self) for command, func in command_registry.items()
+        }
         self.signal_bot._event_loop.create_task(
-            self.periodic()
+            self._startup()
         )  # pylint: disable=protected-access
 
+    async def _startup(self) -> None:
+        """Clears the weekly cache in debug mode and runs the periodic task afterwards"""
+        if self.debug:
+            logger.warning(
+                "DEBUG MODE ENABLED. "
+                "WILL CLEAR WEEKLY CACHE. "
+                "THIS RESULTS IN ALL PERIODIC MESSAGES BEING RESENT. "
+                "BE CAREFUL TO AVOID SPAM"
+            )
+            _, _, cache_key = today()
+            await _cache().delete(cache_key)
+        await self.periodic()
+
     async def _handle(self, text: str) -> None:
         """Bot Command handler. Handles any bot command passed to it.
 
@@ -104,25 +181,25 @@ class RosiBot(Command):
         Args:
             text (str): Bot command
         """
-        if text.startswith(BOT_COMMAND_DELIMITER):
-            if len(text) > MAX_COMMAND_LENGTH:
-                logger.error(
-                    f"Invalid Bot command. Length {len(text)} exceeds allowed length of {MAX_COMMAND_LENGTH}"
-                )
-                return
-            await self._handle_command(text.strip())
-        else:
+        if text[:1] != BOT_COMMAND_DELIMITER:
             logger.debug(
                 "Recieved Messages that does not appear to be a command. Do nothing"
             )
-
-    async def _handle_command(self, command: str) -> None:
-
-        logger.debug(f"Received Bot command: {command}")
-        if command in command_registry:
-            await command_registry[command](self, command)
+            return
+        if len(text) > MAX_COMMAND_LENGTH:
+            logger.error(
+                "Invalid Bot command. Length %d exceeds allowed length of %d",
+                len(text),
+                MAX_COMMAND_LENGTH,
+            )
+            return
+        command = text.strip()
+        logger.debug("Received Bot command: %s", command)
+        handler = self._dispatch.get(command)
+        if handler is not None:
+            await handler(command)
         else:
-            logger.warning(f"Recieved unknown bot command '{command}'. Ignore")
+            logger.warning("Recieved unknown bot command '%s'. Ignore", command)
 
     def register(self) -> None:
         """Wrapper for singalbots register function."""
@@ -145,83 +222,76 @@ class RosiBot(Command):
         """
         await self._handle(context.message.text)
 
-    async def periodic(self, seconds: int = 5) -> None:
+    async def periodic(self, max_seconds: int = PERIODIC_MAX_SLEEP) -> None:
         """Period Task used to send weekly reminders
 
+        The task re-checks the weekly state at least once every max_seconds. It wakes
+        earlier at the next MONDAY or FRIDAY boundary or when a command changes the state.
+
         Args:
-            seconds (int, optional): Period in seconds the task is run. Defaults to 5.
+            max_seconds (int, optional): Upper bound in seconds between two state checks.
+                Defaults to PERIODIC_MAX_SLEEP.
         """
-        i = 0
+        cache_set = _cache().set
+        advance_state = _advance_state()
+        send = self.send
+        monday_message = self._monday_message
+        friday_message = self._friday_message
+        state_changed = self._state_changed
+        # The weekly state is claimed atomically before a reminder is sent. This keeps a concurrent
+        # !erledigt from being overwritten, at the cost of not retrying a failed send that week.
         while True:
-            logger.debug(f"Running Periodic Task iteration {i}")
-            year, weekday, week = today()
-            cache_key = get_cache_key(year, week)
-            cache_value = cache.get(cache_key)
+            weekday, week, cache_key = today()
             if weekday == MONDAY:
-                if cache_value is not None:
-                    logger.debug("Weekly maintenance message already sent. Do nothing")
-                else:
+                # SET NX so a concurrent !erledigt is never overwritten
+                if await cache_set(cache_key, _FRESH, nx=True):
                     logger.info(
                         "Monday maintenance reminder for this week not sent yet. Create Lock file and send reminder."
                     )
-                    cache.set(cache_key, PeriodicState.FRESH.value)
-                    message = messages.get_periodic_message("WEEKLY_MONDAY")
-                    await self.send(message.format(KW=f"KW {week}"))
-            if weekday == FRIDAY:
-                if cache_value is not None:
-                    state = PeriodicState.FRESH.value
-                    try:
-                        state = int(cache_value.decode("utf-8"))
-                    except TypeError:
-                        logger.error(
-                            "Could not fetch cache content. Error while casting to int"
-                        )
-                        return
-                    if state == PeriodicState.FRESH.value:
-                        logger.info(
-                            "Friday maintenance reminder for this week not sent yet. "
-                            "Create Lock file and send reminder."
-                        )
-                        message = messages.get_periodic_message("WEEKLY_FRIDAY")
-                        await self.send(message)
-                        cache.set(cache_key, PeriodicState.REMINDER_SENT.value)
+                    await send(monday_message.format(KW=f"KW {week}"))
                 else:
+                    logger.debug("Weekly maintenance message already sent. Do nothing")
+            if weekday == FRIDAY:
+                # Only FRESH (or unset) may advance to REMINDER_SENT, DONE is never overwritten
+                cache_value = await advance_state(keys=[cache_key], args=[_REMINDER_SENT, _FRESH])
+                if cache_value is None:
                     logger.warning(
                         "Its Friday and not weekly maintenance message is send yet. "
                         "This should not happen. Creating file anyway and send regular maintenance message!"
                     )
-                    cache.set(cache_key, PeriodicState.REMINDER_SENT.value)
-                    message = messages.get_periodic_message("WEEKLY_MONDAY")
-                    await self.send(message.format(KW=f"KW {week}"))
-            i += 1
-            await asyncio.sleep(seconds)
+                    await send(monday_message.format(KW=f"KW {week}"))
+                elif int(cache_value) == _FRESH:
+                    logger.info(
+                        "Friday maintenance reminder for this week not sent yet. "
+                        "Create Lock file and send reminder."
+                    )
+                    await send(friday_message)
+            try:
+                await asyncio.wait_for(
+                    state_changed.wait(),
+                    timeout=min(seconds_until_next_trigger(), max_seconds),
+                )
+            except asyncio.TimeoutError:
+                pass
+            state_changed.clear()
 
     @register_command("!hilfe")
     async def _handle_help(self, command: str) -> None:
-        message, _ = messages.get_command_message(command)
+        message, _ = _messages().get_command_message(command)
         if message:
             await self.send(message)
 
     @register_command("!erledigt")
     async def _handle_maintenance_done(self, command: str) -> None:
-        message, fail = messages.get_command_message(command)
-        year, _, week = today()
-        cache_key = get_cache_key(year, week)
-        cache_value = cache.get(cache_key)
-        state = PeriodicState.FRESH.value
-        if cache_value is not None:
-            try:
-                state = int(cache_value.decode("utf-8"))
-            except TypeError:
-                logger.error(
-                    "Could not fetch cache content. Error while casting to int"
-                )
-                return
-        if state != PeriodicState.DONE:
-            logger.debug(f"Weekly maintenance for {week} done. Updating Log file")
-            cache.set(cache_key, PeriodicState.DONE.value)
+        message, fail = _messages().get_command_message(command)
+        _, week, cache_key = today()
+        cache_value = await _set_state()(keys=[cache_key], args=[_DONE])
+        state = int(cache_value) if cache_value is not None else _FRESH
+        if state != _DONE:
+            logger.debug("Weekly maintenance for %d done. Updating Log file", week)
+            self._state_changed.set()
             await self.send(message)
         else:
-            logger.debug(f"Weekly maintenance for {week} already done. Do nothing")
+            logger.debug("Weekly maintenance for %d already done. Do nothing", week)
             if fail:
                 await self.send(fail)
@@ -1,11 +1,15 @@
 """Wrapper class to hold messages for certain command or periodic messages"""
 
 from typing import Optional
+from pathlib import Path
+import functools
 import json
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 MESSAGES_FILE = "messages.json"
+COMMAND_MESSAGE_KEYS = {"SUCCESS", "FAIL"}
 
 class Messages:
     """Wrapper Class for message definitions.
@@ -14,55 +18,21 @@ class Messages:
     Commands are usually user input that prompt the bot to do something.
     Periodic Messages are simple messages send on a periodic basis.
 
-    """
-    class CommandMessage:
-        """A message sent as a response to a command.
-        Commands always have a success message attached. 
-        Optionally commands can also contain a failure message that can be returned on errors
-        """
-
-        def __init__(
-            self, command: str, success: str, fail: Optional[str] = None
-        ) -> None:
-            self.command = command
-            self.success = success
-            self.fail = fail
-
-    class PeriodicMessage:
-        """A periodic message. Periodic messages only consists of a single message with no failure message"""
+    Commands always have a success message attached and optionally a failure message
+    that can be returned on errors. They are stored as (success, fail) tuples.
+    In the message file a command is either a plain string or a dict with a "SUCCESS"
+    and an optional "FAIL" key.
 
-        def __init__(self, message: str) -> None:
-            self.message = message
+    """
 
     def __init__(self, message_file: str = MESSAGES_FILE):
         self.message_file = message_file
-        self.periodic: dict[str, Messages.PeriodicMessage] = {}
-        self.commands: dict[str, Messages.CommandMessage] = {}
-        with open(self.message_file, "r", encoding="utf-8") as f:
-            json_messages = json.load(f)
-            if not isinstance(json_messages, dict) or len(json_messages) == 0:
-                logger.warning(
-                    f"No messages could be retrieved from {self.message_file}"
-                )
-                return
-            if "periodic" in json_messages:
-                for message_id, message in json_messages["periodic"].items():
-                    if isinstance(message_id, str) and isinstance(message, str):
-                        self.periodic[message_id] = Messages.PeriodicMessage(message)
-            if "commands" in json_messages:
-                for command, message in json_messages["commands"].items():
-                    if isinstance(message, str):
-                        self.commands[command] = Messages.CommandMessage(
-                            command, message
-                        )
-                    elif isinstance(message, dict) and len(message) == 2:
-                        self.commands[command] = Messages.CommandMessage(
-                            command, message["SUCCESS"], message["FAIL"]
-                        )
-                    else:
-                        raise RuntimeError(
-                            f"Could not parse message dict for command {command}"
-                        )
+        periodic, commands = _load(
+            self.message_file, os.stat(self.message_file).st_mtime
+        )
+        # _load results are shared between instances, copy them so changes stay local
+        self.periodic = dict(periodic)
+        self.commands = dict(commands)
 
     def get_periodic_message(self, message_id: str) -> str:
         """Returns success and failure messages for a given periodic message
@@ -76,9 +46,10 @@ class Messages:
         Returns:
             str: The message we asked for
         """
-        if message_id in self.periodic:
-            return self.periodic[message_id].message
-        raise RuntimeError(f"No periodic message with index: {message_id}")
+        try:
+            return self.periodic[message_id]
+        except KeyError as e:
+            raise RuntimeError(f"No periodic message with index: {message_id}") from e
 
     def get_command_message(self, command: str) -> tuple[str, Optional[str]]:
         """Returns success and failure messages for a given command.
@@ -93,6 +64,40 @@ class Messages:
         Returns:
             Tuple[str, Optional[str]]: Return a success message and an optional failure message
         """
-        if command in self.commands:
-            return (self.commands[command].success, self.commands[command].fail)
-        raise RuntimeError(f"Could not find messages for command {command}")
+        try:
+            return self.commands[command]
+        except KeyError as e:
+            raise RuntimeError(f"Could not find messages for command {command}") from e
+
+
+@functools.lru_cache(maxsize=1)
+def _load(
+    message_file: str, mtime: float  # pylint: disable=unused-argument
+) -> tuple[dict[str, str], dict[str, tuple[str, Optional[str]]]]:
+    """Parses a message file. Cached on path and modification time so the file is only read once per change"""
+    periodic: dict[str, str] = {}
+    commands: dict[str, tuple[str, Optional[str]]] = {}
+    json_messages = json.loads(Path(message_file).read_bytes())
+    if not isinstance(json_messages, dict) or len(json_messages) == 0:
+        logger.warning("No messages could be retrieved from %s", message_file)
+        return periodic, commands
+    if "periodic" in json_messages:
+        for message_id, message in json_messages["periodic"].items():
+            if isinstance(message_id, str) and isinstance(message, str):
+                periodic[message_id] = message
+    if "commands" in json_messages:
+        for command, message in json_messages["commands"].items():
+            if isinstance(message, str):
+                commands[command] = (message, None)
+            elif (
+                isinstance(message, dict)
+                and message.keys() <= COMMAND_MESSAGE_KEYS
+                and isinstance(message.get("SUCCESS"), str)
+                and isinstance(message.get("FAIL"), (str, type(None)))
+            ):
+                commands[command] = (message["SUCCESS"], message.get("FAIL"))
+            else:
+                raise RuntimeError(
+                    f"Could not parse message dict for command {command}"
+                )
+    return periodic, commands